@@ -1,22 +1,76 @@
 # -*- coding: utf-8 -*-
+import atexit
+import functools
 import logging
+import random
 import re
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.message import Message
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 from typing import Dict
+from urllib.parse import urlparse
 
 import click
 
 import requests
-import tenacity
+from requests.adapters import HTTPAdapter
 
 import os
 import json
 
 
 # general timeout for http requests
+# connecting should be quick, so fail that fast, but give the api a while to respond
+connect_timeout_secs=10
 fetch_timeout_secs=60
+request_timeout=(connect_timeout_secs, fetch_timeout_secs)
+# artifact storage can stall for longer mid-download than the api does
+download_timeout=(connect_timeout_secs, 300)
+
+# retry waits are randomly scaled by up to +/- this fraction so clients that failed together don't all retry together
+retry_jitter=0.25
+
+# never wait longer than this for a retry, even if the server's Retry-After asks us to
+max_retry_after_secs=60
+
+# max number of api requests we'll have in flight at once when fanning out (eg. listing targets of every project)
+max_concurrent_requests=8
+
+# size of chunks read from the network & written to disk when downloading artifacts
+download_chunk_size=1024*1024
+
+# git ref prefixes and what they're replaced with to get a branch name (see get_branch_and_label)
+branch_ref_prefix_replacements = (
+	("refs/tags/", ""),
+	("refs/heads/", ""),
+	("refs/pull/", "pull request "),
+)
+
+# any run of characters not allowed in a unity cloud build target name
+target_name_invalid_chars_regex = re.compile("[^0-9a-zA-Z]+")
+
+# control characters (eg. newlines, which would inject extra GITHUB_OUTPUT/GITHUB_ENV vars) are never allowed in a download filename
+download_filename_invalid_chars_regex = re.compile("[\x00-\x1f\x7f]")
+
+# polling starts (and restarts whenever a build's status changes) waiting min_polling_interval secs (or polling_interval if shorter)
+# while the status hasn't changed, the wait between polls grows by this much, up to polling_interval
+min_polling_interval=10.0
+polling_backoff_multiplier=1.5
+# each wait is randomly varied by up to this fraction, so many workflows polling at once drift apart
+polling_jitter=0.1
+
+# build status returned can be one of the below
+# [queued, sentToBuilder, started, restarted, success, failure, canceled, unknown]
+# We class "failure", "cancelled" and "unknown" as failures, "success" as successful, anything else is still running
+failed_build_statuses = frozenset(["failure", "canceled", "cancelled", "unknown"])
+success_build_statuses = frozenset(["success"])
+
+# build meta keys containing any of these are worth printing while we wait for a build
+useful_build_meta_key_substrings = ("InSeconds", "tatus")
 
 
 # setup logging
@@ -31,26 +85,31 @@ GITHUB_WORKSPACE = os.getenv('GITHUB_WORKSPACE')
 if not GITHUB_WORKSPACE:
 	raise Exception(f"GITHUB_WORKSPACE env variable is empty. Expecting this to be a directory")
 
+# resolve once; artifacts are downloaded to GITHUB_WORKSPACE/artifacts
+github_workspace_path = Path( GITHUB_WORKSPACE ).resolve()
+github_artifacts_path = github_workspace_path / "artifacts"
+
 # write out meta back to workflow via github output vars
 # if no env var, write to a local file for debugging
 github_output_filename = os.getenv('GITHUB_OUTPUT') or "GITHUB_OUTPUT.txt"
 github_env_filename = os.getenv('GITHUB_ENV') or "GITHUB_ENV.txt"
 
-def write_github_output_and_env(key: str,value: str) -> None:
-    
-    if github_output_filename:
-        with open(github_output_filename, "a") as output:
-            output.write(f"{key}={value}\n")
-            logger.info(f"Wrote GITHUB_OUTPUT var {key}={value}")
-    
-    if github_env_filename:
-        with open(github_env_filename, "a") as env:
-            env.write(f"{key}={value}\n")
-            logger.info(f"Wrote GITHUB_ENV var {key}={value}")
+# open the files once and keep appending, rather than open/write/close for every key
+# opening here also errors the script early if we can't write github env vars
+# writes go straight to the file (no python buffering), so each var is written out even if the script dies before exiting cleanly
+github_output_fd = os.open(github_output_filename, os.O_WRONLY|os.O_APPEND|os.O_CREAT, 0o644)
+github_env_fd = os.open(github_env_filename, os.O_WRONLY|os.O_APPEND|os.O_CREAT, 0o644)
+atexit.register(os.close, github_output_fd)
+atexit.register(os.close, github_env_fd)
 
+def write_github_output_and_env(key: str,value: str) -> None:
+    line = f"{key}={value}\n".encode()
 
-# error script early if we can't write github env vars
-write_github_output_and_env("github_output_test_key","test_value")
+    os.write(github_output_fd, line)
+    logger.info(f"Wrote GITHUB_OUTPUT var {key}={value}")
+    
+    os.write(github_env_fd, line)
+    logger.info(f"Wrote GITHUB_ENV var {key}={value}")
 
 
 #	logger.info(f"Json, but pretty {pretty_json(Dictionary)}")
@@ -62,6 +121,25 @@ def pretty_json(Json:dict):
 		separators=(',', ': ')
 	)
 
+#	logger.info("Json, but pretty %s", LazyPrettyJson(Dictionary))
+#	only serialises if the message is actually logged, so use this on the polling path
+class LazyPrettyJson:
+	def __init__(self, Json:dict) -> None:
+		self.Json = Json
+
+	def __str__(self) -> str:
+		return pretty_json(self.Json)
+
+#	logger.info("Comma separated %s", LazyJoin(Strings))
+#	only joins if the message is actually logged
+class LazyJoin:
+	def __init__(self, Strings:list, Separator:str=", ") -> None:
+		self.Strings = Strings
+		self.Separator = Separator
+
+	def __str__(self) -> str:
+		return self.Separator.join(self.Strings)
+
 
 
 
@@ -101,16 +179,17 @@ def get_branch_and_label(branch_ref,head_ref):
 	#		this does NOT work for pull requests; refs/pull/6/merge; refs/tag/xxx
 	#		for pull requests, we need to use head_ref
 	branch = branch_ref
-	branch = branch.replace("refs/tags/", "")
-	branch = branch.replace("refs/heads/", "")
-	branch = branch.replace("refs/pull/", "pull request ")
+	for prefix, replacement in branch_ref_prefix_replacements:
+		if branch.startswith(prefix):
+			branch = replacement + branch[len(prefix):]
+			break
 
 	# for pull requests the label wants to be branch_ref to indicate it's a pr
 	label = branch
 
 	# strip the head ref down to a branch, in case we use it
 	head_ref = head_ref or ""
-	head_ref = head_ref.replace("refs/heads/", "")
+	head_ref = head_ref.removeprefix("refs/heads/")
 
 	if is_pull_request:
 		branch = head_ref
@@ -135,7 +214,7 @@ def get_build_targetname(primary_build_target,branch_and_label):
 	# replace any special chars and ensure length is max of 56 chars
 	# 64 is the limit, but we allow some free chars for platform
 	# todo: just do 64-(prefix-length)
-	target_name = re.sub("[^0-9a-zA-Z]+", "-", target_name)
+	target_name = target_name_invalid_chars_regex.sub("-", target_name)
 	target_name = f"{primary_build_target}-{target_name}"
 	# 64 char limit for targets (citation needed)
 	target_name = target_name[:63]
@@ -147,6 +226,47 @@ def get_build_targetname(primary_build_target,branch_and_label):
 	
 
 
+# raised when an api request responds with an unexpected status
+# the message (which decodes the response body) is only built if it's actually printed
+# content is read lazily from the response, unless it's given here
+# (streamed responses must pass it, as the body can't be read once the response is closed)
+class RequestError(Exception):
+	def __init__(self, response: requests.Response, url: str, expected_status_codes: frozenset=frozenset([200]), content: str=None) -> None:
+		super().__init__()
+		self.response = response
+		self.status_code = response.status_code
+		self.url = url
+		self.expected_status_codes = expected_status_codes
+		self.content = content
+
+	def __str__(self) -> str:
+		content = self.content if self.content is not None else self.response.text
+		return f"Request failed with status {self.status_code}(not {sorted(self.expected_status_codes)}) content={content} with url={self.url}"
+
+
+# is a failed response worth retrying; rate limited or a server error
+def is_retryable_status_code(status_code: int) -> bool:
+	return status_code == 429 or status_code >= 500
+
+
+# if the server told us how long to wait before retrying (429/503), get that in seconds
+# Retry-After is either a number of seconds or a http date
+def get_retry_after_secs(response: requests.Response):
+	retry_after = response.headers.get("Retry-After") or ""
+	if retry_after.isdigit():
+		return min( int(retry_after), max_retry_after_secs )
+	try:
+		retry_at = parsedate_to_datetime(retry_after)
+	except (TypeError, ValueError):
+		return None
+	if retry_at.tzinfo is None:
+		retry_at = retry_at.replace(tzinfo=timezone.utc)
+	wait_secs = (retry_at - datetime.now(timezone.utc)).total_seconds()
+	if wait_secs <= 0:
+		return None
+	return min( wait_secs, max_retry_after_secs )
+
+
 # client that just connects to unity cloud build and does standard calls
 # no project/builder specific functionality in here!
 # custom code like "nice build names from pull releases" should be somewhere else (UnityCloudBuilder)
@@ -166,30 +286,98 @@ class UnityCloudClient:
         self.api_key = api_key
         self.api_request_base_url = f"{self.api_base_url}/orgs/{self.org_id}"
 
-    def get_request_headers(self) -> Dict:
-        # get base headers for any REST requests
-        return {
-            "Content-Type": "application/json",
+        # base headers for any REST requests; these never change so build them once
+        # Content-Type is set per request by requests when sending json=
+        self.request_headers = {
             "Authorization": f"Basic {self.api_key}",
         }
+
+        # one pooled keep-alive session for all requests, so we don't pay for a new TLS handshake on every poll
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+        self.session.headers.update(self.get_request_headers())
+
+        # last response for urls fetched with send_request(conditional=True)
+        self.conditional_responses = {}
+
+        # share urls we've created, keyed by (project_id, build_target_name, build_number)
+        self.share_urls = {}
+
+    def close(self) -> None:
+        # release pooled connections
+        self.session.close()
+
+    def get_request_headers(self) -> Dict:
+        # get base headers for any REST requests
+        return self.request_headers
         
-    def send_request(self, api_url: str) -> Dict:
-        headers = self.get_request_headers()
+    def request_with_retries(self, method: str, url: str, max_attempts: int=3, retry_timeouts: bool=False, timeout=request_timeout, **kwargs) -> requests.Response:
+        # retries connection errors and rate limited/server error responses with an exponential, jittered wait (4..10 secs)
+        # after the last attempt the final response is returned for the caller to check
+        # timeouts are only retried if retry_timeouts, otherwise callers (eg. polling, which counts its own timeouts) decide what to do with those
+        # only use this for idempotent requests (GET/PUT); retrying a POST could eg. start a second build
+        retry_delay = 4
+        for attempt in range(1,max_attempts+1):
+            try:
+                response = self.session.request( method, url, timeout=timeout, **kwargs )
+                if not is_retryable_status_code(response.status_code) or attempt == max_attempts:
+                    return response
+                error = f"status={response.status_code}"
+                wait_secs = get_retry_after_secs(response) or retry_delay * random.uniform(1.0-retry_jitter, 1.0+retry_jitter)
+                # release the connection of the response we're not going to use (matters for streamed responses)
+                response.close()
+            # ConnectTimeout is also a ConnectionError, so check for timeouts first
+            except requests.exceptions.Timeout as exception:
+                if not retry_timeouts or attempt == max_attempts:
+                    raise
+                error = f"{exception}"
+                wait_secs = retry_delay * random.uniform(1.0-retry_jitter, 1.0+retry_jitter)
+            except requests.exceptions.ConnectionError as exception:
+                if attempt == max_attempts:
+                    raise
+                error = f"{exception}"
+                wait_secs = retry_delay * random.uniform(1.0-retry_jitter, 1.0+retry_jitter)
+
+            logger.info(f"{method} {url} failed ({attempt}/{max_attempts} attempts) - {error}. Retrying in {wait_secs:.1f} secs...")
+            time.sleep(wait_secs)
+            retry_delay = min( retry_delay*2, 10 )
+
+    def send_request(self, api_url: str, conditional: bool=False) -> Dict:
+        # conditional requests send the ETag/Last-Modified of the last response for this url,
+        # and if the server replies 304 Not Modified, we return the last response's data
+        # only use this where the caller won't modify the returned data, as it is shared between calls
         url = f"{self.api_request_base_url}{api_url}"
-        response = requests.get( url, headers=headers, timeout=fetch_timeout_secs )
+        headers = {}
+        cached_response = self.conditional_responses.get(url) if conditional else None
+        if cached_response:
+            if cached_response["etag"]:
+                headers["If-None-Match"] = cached_response["etag"]
+            elif cached_response["last_modified"]:
+                headers["If-Modified-Since"] = cached_response["last_modified"]
+
+        response = self.request_with_retries( "GET", url, headers=headers )
         
+        if cached_response and response.status_code == 304:
+            return cached_response["data"]
+
         if response.status_code != 200:
-            raise Exception(f"Request failed with status {response.status_code} content={response.text} with url={url}")
+            raise RequestError( response, url )
         data = response.json()
+
+        if conditional:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                self.conditional_responses[url] = { "etag":etag, "last_modified":last_modified, "data":data }
         return data
 
-    def post_request(self, api_url: str, post_body:Dict, success_codes=[200]) -> Dict:
-        headers = self.get_request_headers()
+    def post_request(self, api_url: str, post_body:Dict, success_codes: frozenset=frozenset([200])) -> Dict:
+        # posts create things (targets, builds, shares) so are never retried, see request_with_retries()
         url = f"{self.api_request_base_url}{api_url}"
-        response = requests.post( url, headers=headers, timeout=fetch_timeout_secs, data=json.dumps(post_body) )
+        response = self.session.post( url, timeout=request_timeout, json=post_body )
         
-        if not response.status_code in success_codes:
-            raise Exception(f"Request failed with status {response.status_code}(not {success_codes}) content={response.text} with url={url}")
+        if response.status_code not in success_codes:
+            raise RequestError( response, url, success_codes )
             
         data = response.json()
         # insert response code
@@ -204,21 +392,16 @@ class UnityCloudClient:
     def list_projects(self) -> Dict:
         logger.info(f"Fetching projects for {self.org_id}...")
         meta = self.send_request(f"/projects")
-        projects = []
-        for project in meta:
-            projects.append( project["projectid"] )
-        
-        projects_string = ", ".join(projects)
-        logger.info(f"Found organisation projects; {projects_string}")
+        projects = [ project["projectid"] for project in meta ]
+
+        logger.info("Found organisation projects; %s", LazyJoin(projects))
         return projects
         
     # List all the build targets for this org/project. This is essentially to verify credentials/org/project settings
     def list_build_targets(self, project_id:str) -> Dict:
         logger.info(f"Fetching build targets for {self.org_id}/{project_id}...")
         meta = self.send_request(f"/projects/{project_id}/buildtargets")
-        build_targets = []
-        for build_target in meta:
-            build_targets.append( build_target["buildtargetid"] )
+        build_targets = [ build_target["buildtargetid"] for build_target in meta ]
 
         #build_targets_string = ", ".join(build_targets)
         #logger.info(f"Got project {project_id} build targets; {build_targets_string}")
@@ -227,8 +410,9 @@ class UnityCloudClient:
             
     def get_build_meta(self, project_id: str, build_target_name: str, build_number: int) -> None:
         #	gets the status of the running build, returns None if non-error (timeout)
-        logger.info(f"Checking status of build {project_id}/{build_target_name}/{build_number}...")
-        data = self.send_request(f"/projects/{project_id}/buildtargets/{build_target_name}/builds/{build_number}")
+        logger.info("Checking status of build %s/%s/%s...", project_id, build_target_name, build_number)
+        # this gets polled a lot while waiting for builds, and rarely changes between polls
+        data = self.send_request(f"/projects/{project_id}/buildtargets/{build_target_name}/builds/{build_number}", conditional=True)
         return data
         
         
@@ -241,21 +425,20 @@ class UnityCloudClient:
         #	All other statuses, we return no info back (None)
         build_meta = self.get_build_meta( project_id, build_target_name, build_number )
 
-        failed_statuses = ["failure", "canceled", "cancelled", "unknown"]
-        success_statuses = ["success"]
         status = build_meta["buildStatus"]
 
-        if status in failed_statuses:
+        if status in failed_build_statuses:
             raise Exception(f"Build {project_id}/{build_target_name}/{build_number} failed with status: {status}; meta={build_meta}")
 
-        if status in success_statuses:
+        if status in success_build_statuses:
             logger.info(f"Build {project_id}/{build_target_name}/{build_number} completed successfully!")
             return build_meta
                 
-        logger.info(f"Build {project_id}/{build_target_name}/{build_number} is still running: {status}; meta={pretty_json(build_meta)}")
+        logger.info("Build %s/%s/%s is still running: %s; meta=%s", project_id, build_target_name, build_number, status, LazyPrettyJson(build_meta))
         return None
 
-    def get_share_url_from_share_id(self, share_id:str ) -> str:
+    @staticmethod
+    def get_share_url_from_share_id(share_id:str ) -> str:
         return f"https://developer.cloud.unity3d.com/share/share.html?shareId={share_id}"
 
     def create_share_url(self, project_id:str, build_target_name: str,build_number: int) -> str:
@@ -263,11 +446,18 @@ class UnityCloudClient:
         create_share_url = f"/projects/{project_id}/buildtargets/{build_target_name}/builds/{build_number}/share"
         post_body = {'shareExpiry':''}
         share_meta = self.post_request( create_share_url, post_body )
-        logger.info(f"Created share {share_meta}")
-        return self.get_share_url_from_share_id( share_meta["shareid"] )
+        logger.info("Created share %s", share_meta)
+        share_url = self.get_share_url_from_share_id( share_meta["shareid"] )
+        self.share_urls[(project_id, build_target_name, build_number)] = share_url
+        return share_url
     
     
     def get_share_url(self, project_id:str, build_target_name: str,build_number: int) -> str:
+        # we already know the url if we created the share
+        share_url = self.share_urls.get((project_id, build_target_name, build_number))
+        if share_url:
+            return share_url
+
         # fetch share id
         share_meta = self.send_request(f"/projects/{project_id}/buildtargets/{build_target_name}/builds/{build_number}/share")
         # responds with
@@ -280,11 +470,7 @@ class UnityCloudClient:
         logger.info(f"Fetching builds for build target {build_target} for {self.org_id}/{project_id}...")
         meta = self.send_request(f"/projects/{project_id}/buildtargets/{build_target}/builds")
         #logger.info(f"Got builds from target; {meta}")
-        buildnumbers = {}
-        for build_meta in meta:
-            buildnumber = build_meta["build"]
-            status = build_meta["buildStatus"]
-            buildnumbers[buildnumber] = status
+        buildnumbers = { build_meta["build"]: build_meta["buildStatus"] for build_meta in meta }
 
         return buildnumbers
 
@@ -323,50 +509,62 @@ class UnityCloudBuilder:
         self.client = client
 
 
+    # primary target meta is needed to resolve the target name and again to clone it for a new target
+    # so only fetch it once. This is shared, so don't modify it!
+    @functools.cached_property
+    def primary_target_meta(self) -> Dict:
+        logger.info(f"Fetching Primary Build Target Meta: {self.primary_build_target}...")
+        return self.client.get_build_target_meta( self.project_id, self.primary_build_target )
+
     def get_build_targetname(self):
         # if the primary target's branch is the same as the branch we're using
         # then the build target is the primary target
-        primary_target_meta = self.client.get_build_target_meta( self.project_id, self.primary_build_target )
-        primary_build_branch = primary_target_meta["settings"]["scm"]["branch"]
+        primary_build_branch = self.primary_target_meta["settings"]["scm"]["branch"]
         if primary_build_branch == self.branch_and_label.branch:
             return self.primary_build_target
 
         target_name = get_build_targetname( self.primary_build_target, self.branch_and_label )
         return target_name
 
-    @tenacity.retry(
-        wait=tenacity.wait_exponential(multiplier=1, min=4, max=10),
-        stop=tenacity.stop_after_attempt(10),
-        after=tenacity.after_log(logger, logging.DEBUG)
-    )
-    def set_build_target_env_var(
-        self, build_target_name: str, key: str, value: str
-    ) -> None:
+    def set_build_target_env_vars(self, build_target_name: str, env_vars: Dict) -> None:
         """
-        sets an env var to a build target.
-
-        TODO: If we need more than a couple of env vars- we should update this func to set vars in bulk
+        sets env vars on a build target, all keys in one request
         """
-        logger.info(f"Setting env var: {key} on target: {build_target_name}...")
-        resp = requests.put(
-            f"{self.api_base_url}/orgs/{self.org_id}/projects/{self.project_id}/buildtargets/{build_target_name}/envvars",
-            headers=self.client.get_request_headers(),
-            json={key: value},
-        )
+        logger.info(f"Setting env vars: {', '.join(env_vars)} on target: {build_target_name}...")
+        url = f"{self.client.api_request_base_url}/projects/{self.project_id}/buildtargets/{build_target_name}/envvars"
+
+        # encode the body once, rather than on every attempt
+        body = json.dumps(env_vars)
+
+        # retry transient failures, anything else (eg. 400 bad request) won't get better by trying again
+        resp = self.client.request_with_retries( "PUT", url, max_attempts=10, retry_timeouts=True, data=body, headers={"Content-Type": "application/json"} )
         if resp.status_code == 200:
             return
-        raise Exception(f"Env var could not be set - received status={resp.status_code} content={resp.text}")
-
+        raise RequestError( resp, url )
 
+    def set_build_target_env_var(
+        self, build_target_name: str, key: str, value: str
+    ) -> None:
+        """
+        sets an env var to a build target. Prefer set_build_target_env_vars() when setting more than one
+        """
+        self.set_build_target_env_vars(build_target_name, {key: value})
 
 
     def get_build_target_meta(self,allow_new_target:bool):
         build_target_name = self.get_build_targetname()
+
+        # we've already fetched the primary target's meta, don't ask for it again
+        if build_target_name == self.primary_build_target:
+            return self.primary_target_meta
         
+        # only a 404 means there's no target; anything else (auth errors, server errors, connection failures etc) should propagate
         try:
             existing_meta = self.client.get_build_target_meta( self.project_id, build_target_name )
             return existing_meta
-        except Exception as e:
+        except RequestError as e:
+            if e.status_code != 404:
+                raise
             logger.info(f"No build target meta for {build_target_name}... {e}")
         
         if not allow_new_target:
@@ -381,41 +579,46 @@ class UnityCloudBuilder:
         #	branch and label are already calculated
         
         #	get primary build target meta
-        logger.info(f"Fetching Primary Build Target Meta: {self.primary_build_target}...")
-        primary_target_meta = self.client.get_build_target_meta( self.project_id, self.primary_build_target )
-        logger.info(f"Primary Build Target Meta: {pretty_json(primary_target_meta)}")
+        primary_target_meta = self.primary_target_meta
+        logger.debug("Primary Build Target Meta: %s", LazyPrettyJson(primary_target_meta))
         
         logger.info(f"Creating new build target({build_target_name}) for branch {self.branch_and_label.branch}...")
 
         # setup new payload copying relevant settings from the primary build target
+        # copy only the parts of settings we change, so the cached primary meta is left untouched
+        primary_settings = primary_target_meta["settings"]
+        settings = {
+            **primary_settings,
+            #	the branch here is used with git clone --branch XXX
+            #	see get_branch_and_label()
+            "scm": { **primary_settings["scm"], "branch": self.branch_and_label.branch },
+            #	reset some other settings
+            "buildSchedule": {},
+        }
+
         payload = {
             "name": build_target_name,
             "enabled": True,
             "platform": primary_target_meta["platform"],
-            "settings": primary_target_meta["settings"],
+            "settings": settings,
             "credentials": primary_target_meta["credentials"],
         }
-        
-        #	the branch here is used with git clone --branch XXX
-        #	see get_branch_and_label()
-        payload["settings"]["scm"]["branch"] = self.branch_and_label.branch
-
-        #	reset some other settings
-        payload["settings"]["buildSchedule"] = {}
 
         # make the new build target
         # unity returns 201 when we get a new config
         # 500 -> .error == "Build target name already in use for this project!"
         # means that our generated name already exists, we want to catch & reuse that
         #	gr: the new version of the code should probably fail here, as we should have already checked if it exists
-        success_codes = [201,500]
+        success_codes = frozenset([201,500])
         new_target_meta = self.client.post_request(f"/projects/{self.project_id}/buildtargets", payload, success_codes )
         
         print(f"new_target_meta = {new_target_meta}")
         if new_target_meta["post_request_response_status_code"] == 500:
             error = new_target_meta["error"]
             if error == "Build target name already in use for this project!":
-                logger.info(f"Build target for this branch already exists: {new_target_name}. Re-using...")
+                # someone else created it since we checked, so fetch it rather than returning the error
+                logger.info(f"Build target for this branch already exists: {build_target_name}. Re-using...")
+                return self.client.get_build_target_meta( self.project_id, build_target_name )
             else:
                 raise Exception(f"New target had error: {error}")
 
@@ -428,7 +631,7 @@ class UnityCloudBuilder:
 
         post_body = {"clean": clean, "delay": 0}
         start_build_url = f"/projects/{self.project_id}/buildtargets/{build_target_name}/builds"
-        orig_build_meta = self.client.post_request( start_build_url, post_body, [202] )
+        orig_build_meta = self.client.post_request( start_build_url, post_body, frozenset([202]) )
         build_meta = orig_build_meta[0]
         error = build_meta.get("error")
         if error:
@@ -444,57 +647,75 @@ class UnityCloudBuilder:
         return build_number
 
 
-def download_file_to_workspace(url: str) -> Dict:
+#	get the filename of a download from its content-disposition header
+#	(which may be quoted, or encoded as filename*=UTF-8''...), or failing that, the url
+def get_download_filename(response: requests.Response, url: str) -> str:
+	content_disposition = Message()
+	content_disposition["content-disposition"] = response.headers.get('content-disposition') or ""
+	filename = content_disposition.get_filename() or Path( urlparse(url).path ).name
+	if not filename:
+		raise Exception(f"Dont know how to get filename from url/response (no content-disposition) url={url}")
+	# never let the header choose a directory
+	filename = Path(filename).name
+	if filename in ("", ".", "..") or download_filename_invalid_chars_regex.search(filename):
+		raise Exception(f"Download filename {filename!r} is not a valid filename. url={url}")
+	return filename
+
+
+def download_file_to_workspace(client: UnityCloudClient, url: str) -> Dict:
 	logger.info(f"Downloading file to workspace ({GITHUB_WORKSPACE})... {url}")
 	
-	response = requests.get(url, allow_redirects=True)
-	if response.status_code != 200:
-		raise Exception(f"Request failed with status {response.status_code} content={response.text} with url={url}")
-
-	#	find filename from response
-	filename = response.headers.get('content-disposition') or ""
-	if filename.startswith("attachment; filename="):
-		filename = filename.replace("attachment; filename=","")
-	else:
-		raise Exception("Dont know how to get filename from url/response (no content-disposition")
-
-	# files must be written inside the GITHUB_WORKSPACE
-	filepath = Path( GITHUB_WORKSPACE ) / "artifacts" / filename
-	filepath_absolute = filepath.absolute()
-	if not filepath.is_relative_to(GITHUB_WORKSPACE):
-		logger.warning(f"filepath({filepath_absolute} is not relative to GITHUB_WORKSPACE({GITHUB_WORKSPACE})")
-
-	directory = filepath.parent
-	directory.mkdir(parents=True,exist_ok=True)
-	try:
-		logger.info(f"Writing download to {filepath_absolute}...")
-		filepath.write_bytes(response.content)
-	except IOError as exception:
-		raise Exception(f"Could not file download to disk ({filepath_absolute}): {exception}")
+	# note: the download link is not on the api host, so don't send our api credentials along with it
+	# stream the response so we never hold the whole artifact (can be gigabytes) in memory
+	# the build has already finished by now, so retry transient failures (including timeouts) getting the download started
+	# (a failure part way through the body is not retried)
+	with client.request_with_retries( "GET", url, retry_timeouts=True, timeout=download_timeout, allow_redirects=True, headers={"Authorization": None}, stream=True ) as response:
+		if response.status_code != 200:
+			raise RequestError( response, url, content=response.text )
+
+		#	find filename from response
+		filename = get_download_filename( response, url )
+
+		# files must be written inside the GITHUB_WORKSPACE, refuse to write anywhere else
+		filepath = github_artifacts_path / filename
+		filepath_absolute = filepath.resolve()
+		if filepath_absolute.parent != github_artifacts_path.resolve() or not filepath_absolute.is_relative_to(github_workspace_path):
+			raise Exception(f"filepath({filepath_absolute}) is not inside GITHUB_WORKSPACE artifacts dir ({github_artifacts_path})")
+
+		github_artifacts_path.mkdir(parents=True,exist_ok=True)
+		try:
+			logger.info(f"Writing download to {filepath_absolute}...")
+			with open(filepath, "wb") as file:
+				for chunk in response.iter_content(chunk_size=download_chunk_size):
+					file.write(chunk)
+		except IOError as exception:
+			raise Exception(f"Could not file download to disk ({filepath_absolute}): {exception}")
 
 	# need to output a github_workspace relative path
-	workspacefilepath = str( filepath.relative_to(GITHUB_WORKSPACE) )
+	workspacefilepath = str( filepath.relative_to(github_workspace_path) )
 	meta = { "filename":filename, "filepath":workspacefilepath}
 	logger.info(f"Download to {meta['filepath']} successful!")
 	return meta
 
 
 def is_useful_build_meta_key(key: str):
-	if "InSeconds" in key:
-		return True
-	if "tatus" in key:
-		return True
-
-	return False
+	return any( substring in key for substring in useful_build_meta_key_substrings )
 
 def wait_for_successfull_build(client: UnityCloudClient, project_id:str, build_target_name:str, build_number:int, polling_interval:float ):
 	
 	#	gr: reset the timeout count whenever there's a successfull response so we stick around over blips
 	timeout_count = 0
 	max_timeouts_in_a_row = 6
+
+	#	builds change status quickly at the start, then sit in "started" for a long time
+	#	so back off the wait while the status is unchanged, and go back to a short wait when it changes
+	min_wait_secs = min( polling_interval, min_polling_interval )
+	max_wait_secs = polling_interval
+	wait_secs = min_wait_secs
+	last_status = None
 	
 	while timeout_count < max_timeouts_in_a_row:
-		time.sleep(polling_interval)
+		time.sleep( wait_secs * random.uniform(1.0-polling_jitter, 1.0+polling_jitter) )
 
 		try:
 			build_meta = client.get_build_meta( project_id, build_target_name, build_number )
@@ -503,29 +724,30 @@ def wait_for_successfull_build(client: UnityCloudClient, project_id:str, build_t
 
 		# catch timeouts, but anything else should throw
 		except requests.exceptions.Timeout:
-			logger.info(f"Timeout fetching build meta ({timeout_count}/{max_timeouts_in_a_row} tries). Waiting {polling_interval} secs...")
+			logger.info("Timeout fetching build meta (%s/%s tries). Waiting %s secs...", timeout_count, max_timeouts_in_a_row, wait_secs)
 			timeout_count = timeout_count+1
 			continue
 
 		#	print out useful information!
-		failed_statuses = ["failure", "canceled", "cancelled", "unknown"]
-		success_statuses = ["success"]
 		status = build_meta["buildStatus"]
 
-		useful_meta = {}
-		for key,value in build_meta.items():
-			if is_useful_build_meta_key(key):
-				useful_meta[key] = value
+		useful_meta = { key: value for key,value in build_meta.items() if is_useful_build_meta_key(key) }
 
-		if status in success_statuses:
-			logger.info(f"Build {project_id}/{build_target_name}/{build_number} completed successfully; {pretty_json(useful_meta)}")
+		if status in success_build_statuses:
+			logger.info("Build %s/%s/%s completed successfully; %s", project_id, build_target_name, build_number, LazyPrettyJson(useful_meta))
 			return build_meta
 
-		if status in failed_statuses:
-			logger.info(f"Build {status} meta: {pretty_json(build_meta)}")
+		if status in failed_build_statuses:
+			logger.info("Build %s meta: %s", status, LazyPrettyJson(build_meta))
 			raise Exception(f"Build {project_id}/{build_target_name}/{build_number} failed with status: {status}")
 
-		logger.info(f"Build not finished ({status})... {pretty_json(useful_meta)}")
+		if status == last_status:
+			wait_secs = min( wait_secs * polling_backoff_multiplier, max_wait_secs )
+		else:
+			wait_secs = min_wait_secs
+		last_status = status
+
+		logger.info("Build not finished (%s)... %s", status, LazyPrettyJson(useful_meta))
 
 
 
@@ -561,6 +783,7 @@ def wait_for_successfull_build(client: UnityCloudClient, project_id:str, build_t
 @click.option("--github_branch_ref", envvar="UNITY_CLOUD_BUILD_GITHUB_BRANCH_REF", type=str)
 @click.option("--github_head_ref", envvar="UNITY_CLOUD_BUILD_GITHUB_HEAD_REF", type=str)
 @click.option("--allow_new_target", envvar="UNITY_CLOUD_BUILD_ALLOW_NEW_TARGET", type=bool, default=True)
+@click.option("--list_projects", envvar="UNITY_CLOUD_BUILD_LIST_PROJECTS", type=bool, default=False)
 def main(
     api_key: str,
     org_id: str,
@@ -572,7 +795,8 @@ def main(
     github_head_ref: str,
     create_share: bool,
     existing_build_number: int,
-    allow_new_target: bool
+    allow_new_target: bool,
+    list_projects: bool
 ) -> None:
 
     # sanitise some inputs
@@ -586,28 +810,42 @@ def main(
         api_key,
         org_id
     )
+    atexit.register(client.close)
 
-    # to help users and for debug, just list all projects
-    projects = client.list_projects()
-
-
-    # when we have an existing build number, we don't need a lot of the other meta
-    # but we do need the project it belongs to
-    # do this AFTER listing projects, so user can see a project id they might be looking for
-    # todo: if user supplied build number AND other meta, validate that meta and throw if there's a mismatch
-    if existing_build_number != None and project_id == None:
-        raise Exception(f"existing_build_number({existing_build_number}) supplied, but missing required project_id({project_id})")
-
-    # if the user has provided a project, list it's build targets, otherwise, list em all!
+    # to help users and for debug, list all projects & their build targets
+    # this is a lot of requests for a big organisation, so when we know what project we're building, only do it if asked to
     if project_id:
-        build_targets = client.list_build_targets( project_id )
-        logger.info(f"Project {project_id} build targets; {pretty_json(build_targets)}")
+        # list the project's build targets if they're listing, or not going to build anything
+        build_targets = None
+        if list_projects:
+            # these are independent requests, so overlap them rather than waiting on each in turn
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                projects_future = executor.submit( client.list_projects )
+                build_targets_future = executor.submit( client.list_build_targets, project_id )
+                projects_future.result()
+                build_targets = build_targets_future.result()
+        elif not github_branch_ref:
+            build_targets = client.list_build_targets( project_id )
+
+        if build_targets is not None:
+            logger.info(f"Project {project_id} build targets; {pretty_json(build_targets)}")
     else:
-        for project in projects:
-            build_targets = client.list_build_targets( project )
-            logger.info(f"Project {project} build targets; {pretty_json(build_targets)}")
+        projects = client.list_projects()
+
+        # when we have an existing build number, we don't need a lot of the other meta
+        # but we do need the project it belongs to
+        # do this AFTER listing projects, so user can see a project id they might be looking for
+        # todo: if user supplied build number AND other meta, validate that meta and throw if there's a mismatch
+        if existing_build_number != None:
+            raise Exception(f"existing_build_number({existing_build_number}) supplied, but missing required project_id({project_id})")
+
+        # no project, so list em all!
+        # these are independent requests, so overlap them rather than waiting on each in turn
+        with ThreadPoolExecutor(max_workers=max_concurrent_requests) as executor:
+            projects_build_targets = executor.map( client.list_build_targets, projects )
+            for project, build_targets in zip( projects, projects_build_targets ):
+                logger.info(f"Project {project} build targets; {pretty_json(build_targets)}")
 
-    if not project_id:
         raise Exception(f"No project_id specified, don't know what to build/fetch")
 
     if existing_build_number != None and primary_build_target == None:
@@ -673,7 +911,7 @@ def main(
     
     # Build finished successfully
     if download_binary:
-        artifact_meta = download_file_to_workspace(build_meta["links"]["download_primary"]["href"])
+        artifact_meta = download_file_to_workspace(client, build_meta["links"]["download_primary"]["href"])
         write_github_output_and_env("ARTIFACT_FILENAME", artifact_meta["filename"])
         write_github_output_and_env("ARTIFACT_FILEPATH", artifact_meta["filepath"])
 
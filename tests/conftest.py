@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# action.py needs a workspace and somewhere to write github output/env vars as soon as it's imported
+test_workspace = tempfile.mkdtemp(prefix="unity_cloud_build_test_workspace_")
+os.environ.setdefault("GITHUB_WORKSPACE", test_workspace)
+os.environ.setdefault("GITHUB_OUTPUT", str(Path(test_workspace) / "GITHUB_OUTPUT.txt"))
+os.environ.setdefault("GITHUB_ENV", str(Path(test_workspace) / "GITHUB_ENV.txt"))
+
+# action.py is a script at the repo root rather than a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
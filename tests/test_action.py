@@ -0,0 +1,191 @@
+import io
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+
+import action
+
+
+def make_response(headers: dict) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.headers.update(headers)
+    return response
+
+
+@pytest.mark.parametrize(
+    "content_disposition,expected",
+    [
+        ('attachment; filename="game.ipa"', "game.ipa"),
+        ("attachment; filename=game.ipa", "game.ipa"),
+        ("attachment; filename*=UTF-8''g%C3%A4me%20build.ipa", "gäme build.ipa"),
+    ],
+)
+def test_download_filename_from_content_disposition(content_disposition, expected):
+    response = make_response({"content-disposition": content_disposition})
+    assert action.get_download_filename(response, "https://example.com/other.zip") == expected
+
+
+def test_download_filename_falls_back_to_url():
+    response = make_response({})
+    assert action.get_download_filename(response, "https://example.com/path/build.apk?token=abc") == "build.apk"
+
+
+def test_download_filename_without_header_or_url_filename_raises():
+    response = make_response({})
+    with pytest.raises(Exception):
+        action.get_download_filename(response, "https://example.com/")
+
+
+@pytest.mark.parametrize(
+    "content_disposition,expected",
+    [
+        ('attachment; filename="../../etc/passwd"', "passwd"),
+        ('attachment; filename="/tmp/game.ipa"', "game.ipa"),
+        ("attachment; filename*=UTF-8''..%2F..%2Fgame.ipa", "game.ipa"),
+    ],
+)
+def test_download_filename_strips_directories(content_disposition, expected):
+    response = make_response({"content-disposition": content_disposition})
+    assert action.get_download_filename(response, "https://example.com/other.zip") == expected
+
+
+@pytest.mark.parametrize(
+    "content_disposition",
+    [
+        "attachment; filename*=UTF-8''a.ipa%0AFOO%3Dbar",
+        "attachment; filename*=UTF-8''a%0Db.ipa",
+        "attachment; filename*=UTF-8''..",
+    ],
+)
+def test_download_filename_rejects_invalid_names(content_disposition):
+    response = make_response({"content-disposition": content_disposition})
+    with pytest.raises(Exception):
+        action.get_download_filename(response, "https://example.com/other.zip")
+
+
+@pytest.mark.parametrize(
+    "status_code,expected",
+    [(200, False), (304, False), (400, False), (401, False), (404, False), (429, True), (500, True), (503, True)],
+)
+def test_is_retryable_status_code(status_code, expected):
+    assert action.is_retryable_status_code(status_code) == expected
+
+
+def test_retry_after_seconds():
+    assert action.get_retry_after_secs(make_response({"Retry-After": "5"})) == 5
+
+
+def test_retry_after_seconds_is_capped():
+    response = make_response({"Retry-After": "3600"})
+    assert action.get_retry_after_secs(response) == action.max_retry_after_secs
+
+
+def test_retry_after_http_date():
+    retry_at = time.time() + 20
+    response = make_response({"Retry-After": formatdate(retry_at, usegmt=True)})
+    assert 15 < action.get_retry_after_secs(response) <= 20
+
+
+def test_retry_after_http_date_is_capped():
+    response = make_response({"Retry-After": formatdate(time.time() + 3600, usegmt=True)})
+    assert action.get_retry_after_secs(response) == action.max_retry_after_secs
+
+
+@pytest.mark.parametrize("retry_after", [None, "", "soon", "-5", formatdate(0, usegmt=True)])
+def test_retry_after_missing_invalid_or_past(retry_after):
+    headers = {} if retry_after is None else {"Retry-After": retry_after}
+    assert action.get_retry_after_secs(make_response(headers)) is None
+
+
+def test_connect_timeouts_are_not_retried(mocker):
+    client = action.UnityCloudClient("key", "org")
+    request = mocker.patch.object(client.session, "request", side_effect=requests.exceptions.ConnectTimeout())
+    sleep = mocker.patch.object(action.time, "sleep")
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        client.request_with_retries("GET", "https://example.com/")
+    assert request.call_count == 1
+    sleep.assert_not_called()
+
+
+def test_env_var_put_retries_read_timeouts(mocker):
+    client = action.UnityCloudClient("key", "org")
+    builder = action.UnityCloudBuilder(client, "project", "mac", action.get_branch_and_label("refs/heads/feature", None))
+    ok_response = make_response({})
+    request = mocker.patch.object(client.session, "request", side_effect=[requests.exceptions.ReadTimeout(), ok_response])
+    mocker.patch.object(action.time, "sleep")
+    builder.set_build_target_env_vars("mac-feature", {"KEY": "value"})
+    assert request.call_count == 2
+    assert request.call_args.args[0] == "PUT"
+
+
+def test_connection_errors_are_retried(mocker):
+    client = action.UnityCloudClient("key", "org")
+    request = mocker.patch.object(client.session, "request", side_effect=requests.exceptions.ConnectionError())
+    mocker.patch.object(action.time, "sleep")
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.request_with_retries("GET", "https://example.com/", max_attempts=3)
+    assert request.call_count == 3
+
+
+def make_builder(mocker, get_build_target_meta_status_code):
+    client = action.UnityCloudClient("key", "org")
+    builder = action.UnityCloudBuilder(client, "project", "mac", action.get_branch_and_label("refs/heads/feature", None))
+    builder.primary_target_meta = {"settings": {"scm": {"branch": "main"}}}
+    response = make_response({})
+    response.status_code = get_build_target_meta_status_code
+    error = action.RequestError(response, "https://example.com/")
+    mocker.patch.object(client, "get_build_target_meta", side_effect=error)
+    create_new_build_target = mocker.patch.object(builder, "create_new_build_target", return_value={"buildtargetid": "mac-feature"})
+    return builder, create_new_build_target
+
+
+def test_missing_build_target_is_created(mocker):
+    builder, create_new_build_target = make_builder(mocker, 404)
+    assert builder.get_build_target_meta(allow_new_target=True) == {"buildtargetid": "mac-feature"}
+    create_new_build_target.assert_called_once()
+
+
+@pytest.mark.parametrize("status_code", [401, 403, 500])
+def test_build_target_lookup_errors_are_not_treated_as_missing(mocker, status_code):
+    builder, create_new_build_target = make_builder(mocker, status_code)
+    with pytest.raises(action.RequestError):
+        builder.get_build_target_meta(allow_new_target=True)
+    create_new_build_target.assert_not_called()
+
+
+def test_list_projects_logs_projects_on_one_line(mocker, caplog):
+    client = action.UnityCloudClient("key", "org")
+    mocker.patch.object(client, "send_request", return_value=[{"projectid": "a"}, {"projectid": "b"}, {"projectid": "c"}])
+    with caplog.at_level("INFO"):
+        assert client.list_projects() == ["a", "b", "c"]
+    assert "Found organisation projects; a, b, c" in caplog.messages
+
+
+def test_download_retries_transient_failures(mocker):
+    client = action.UnityCloudClient("key", "org")
+    unavailable = make_response({})
+    unavailable.status_code = 503
+    unavailable.raw = io.BytesIO(b"")
+    ok = make_response({"content-disposition": 'attachment; filename="game.zip"'})
+    ok.raw = io.BytesIO(b"artifact")
+    request = mocker.patch.object(client.session, "request", side_effect=[requests.exceptions.ConnectionError(), unavailable, ok])
+    mocker.patch.object(action.time, "sleep")
+    meta = action.download_file_to_workspace(client, "https://example.com/game.zip")
+    assert request.call_count == 3
+    assert meta == {"filename": "game.zip", "filepath": "artifacts/game.zip"}
+    assert (action.github_artifacts_path / "game.zip").read_bytes() == b"artifact"
+
+
+def test_download_error_includes_response_body(mocker):
+    client = action.UnityCloudClient("key", "org")
+    not_found = make_response({})
+    not_found.status_code = 404
+    not_found.raw = io.BytesIO(b"no such artifact")
+    mocker.patch.object(client.session, "request", return_value=not_found)
+    with pytest.raises(action.RequestError) as error:
+        action.download_file_to_workspace(client, "https://example.com/game.zip")
+    assert error.value.status_code == 404
+    assert "content=no such artifact" in str(error.value)